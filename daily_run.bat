@@ -8,7 +8,7 @@ call .venv\Scripts\activate.bat
 
 REM  Python }
 git pull
-python src/update_youtube.py
+python src/run_channels.py
 git pull
 git add .
 git commit -am .
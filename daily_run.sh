@@ -1,6 +1,6 @@
 #!/bin/bash
 
-python src/update_youtube.py
+python src/run_channels.py
 python src/verify_chinese.py
 git add .
 git commit -am .
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from channels import root_dir
+
+# === 設定目錄路徑 ===
+# 以內容雜湊命名的檔案都放在 store/objects/ 底下，不進 git
+store_dir = os.path.join(root_dir, 'store/')
+
+# Linux FICLONE ioctl，用於 btrfs/xfs 等支援 reflink 的檔案系統
+FICLONE = 0x40049409
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    計算檔案內容的 sha256
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_path(digest, store=store_dir):
+    """
+    取得雜湊值對應的 blob 路徑，以前兩碼分目錄
+    """
+    return os.path.join(store, 'objects', digest[:2], digest)
+
+
+def reflink(src, dst):
+    """
+    以 reflink 複製檔案（共用磁碟區塊），不支援時丟出 OSError
+    """
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def link_or_copy(src, dst):
+    """
+    將 src 放到 dst，依序嘗試 hardlink、reflink，最後才真的複製位元組
+
+    先寫到暫存檔再改名，避免中斷時留下不完整的 dst
+
+    Returns:
+        使用的方式：'link'、'reflink' 或 'copy'
+    """
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp_file = f"{dst}.tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    try:
+        os.link(src, tmp_file)
+        method = 'link'
+    except (OSError, AttributeError):
+        try:
+            reflink(src, tmp_file)
+            method = 'reflink'
+        except (OSError, ImportError):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            shutil.copy2(src, tmp_file)
+            method = 'copy'
+
+    os.replace(tmp_file, dst)
+    return method
+
+
+def same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def put(path, store=store_dir):
+    """
+    將檔案放入 store，並讓原檔案指向同一個 blob
+
+    Returns:
+        檔案內容的 sha256
+    """
+    digest = hash_file(path)
+    blob = blob_path(digest, store)
+    if not os.path.exists(blob):
+        link_or_copy(path, blob)
+    elif not same_file(path, blob):
+        # 內容相同的檔案已存在，改用 store 中的 blob 省下空間
+        link_or_copy(blob, path)
+    return digest
+
+
+def release(path, digest, store=store_dir):
+    """
+    刪除檔案，若 store 中的 blob 已沒有其他連結也一併刪除
+
+    Returns:
+        實際釋放的位元組數（blob 仍被其他檔案使用時為 0）
+    """
+    blob = blob_path(digest, store) if digest else None
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if os.path.exists(path):
+        os.remove(path)
+    if blob and os.path.exists(blob):
+        if os.stat(blob).st_nlink > 1:
+            return 0
+        size = os.path.getsize(blob)
+        os.remove(blob)
+    return size
+
+
+def gc(references, store=store_dir):
+    """
+    刪除沒有被引用的 blob：沒有其他硬連結（st_nlink == 1），且不在 references 中
+
+    被取代的 srt/mp3（重新轉錄、重新下載）與 retention 刪除後仍留在 store 的 blob 都會在這裡釋放
+
+    Args:
+        references: 仍需要保留的 sha256 集合（未被 retention 刪除的 manifest 項目）
+
+    Returns:
+        (刪除的 blob 數, 釋放的位元組數)
+    """
+    objects_dir = os.path.join(store, 'objects')
+    if not os.path.isdir(objects_dir):
+        return 0, 0
+
+    removed = 0
+    reclaimed = 0
+    for prefix in os.listdir(objects_dir):
+        prefix_dir = os.path.join(objects_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for digest in os.listdir(prefix_dir):
+            if digest in references:
+                continue
+            blob = os.path.join(prefix_dir, digest)
+            stat = os.stat(blob)
+            if stat.st_nlink > 1:
+                continue
+            os.remove(blob)
+            removed += 1
+            reclaimed += stat.st_size
+    return removed, reclaimed
+
+
+def live_digests(manifest, index):
+    """
+    manifest 中未被 retention 刪除的項目的 sha256
+    """
+    return {digest for title, kinds in manifest.items() for kind, digest in kinds.items()
+            if not index.is_evicted(title, kind)}
+
+
+def materialize(digest, dst, store=store_dir):
+    """
+    由 store 中的 blob 產生 dst
+
+    Returns:
+        True 表示有建立或更新 dst，False 表示 dst 已是同一個 blob 或 blob 不存在
+    """
+    blob = blob_path(digest, store)
+    if not os.path.exists(blob) or same_file(blob, dst):
+        return False
+    link_or_copy(blob, dst)
+    return True
+
+
+class Manifest:
+    """
+    記錄每個頻道中 title 與各類檔案雜湊值的對照表，存成 json 並納入 git
+
+    格式：{title: {kind: sha256}}，kind 為 'mp3' 或 'srt'
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, title, kind):
+        with self.lock:
+            return self.entries.get(title, {}).get(kind)
+
+    def set(self, title, kind, digest):
+        with self.lock:
+            if self.entries.get(title, {}).get(kind) == digest:
+                return
+            self.entries.setdefault(title, {})[kind] = digest
+            self.changed = True
+
+    def remove(self, title, kind):
+        with self.lock:
+            if kind in self.entries.get(title, {}):
+                del self.entries[title][kind]
+                if not self.entries[title]:
+                    del self.entries[title]
+                self.changed = True
+
+    def items(self):
+        with self.lock:
+            return [(title, dict(kinds)) for title, kinds in self.entries.items()]
+
+    def save(self):
+        """
+        有變更時才寫入，排序 key 讓 git diff 只包含新增的項目
+        """
+        with self.lock:
+            if not self.changed:
+                return
+            tmp_file = f"{self.path}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+                f.write('\n')
+            os.replace(tmp_file, self.path)
+            self.changed = False
+
+
+class ArtifactIndex(Manifest):
+    """
+    記錄本地檔案的狀態，供 retention 使用，不納入 git
+
+    格式：{title: {kind: {'size', 'added', 'accessed', 'published', 'evicted', 'source'}}}，
+    source 只在 srt 取自 YouTube 字幕（caption_first）時記錄
+    """
+
+    def add(self, title, kind, size):
+        """
+        記錄新產生（或重新產生）的檔案，發佈狀態重設為未發佈
+        """
+        self.set(title, kind, {'size': size, 'added': time.time(),
+                               'accessed': None, 'published': False})
+
+    def update(self, title, kind, **fields):
+        with self.lock:
+            info = self.entries.get(title, {}).get(kind)
+            if info is None:
+                return
+            for key, value in fields.items():
+                if info.get(key) != value:
+                    info[key] = value
+                    self.changed = True
+
+    def touch(self, title, kind, when=None):
+        self.update(title, kind, accessed=when or time.time())
+
+    def mark_published(self, title, kind):
+        self.update(title, kind, published=True)
+
+    def is_evicted(self, title, kind):
+        info = self.get(title, kind)
+        return bool(info and info.get('evicted'))
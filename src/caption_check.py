@@ -0,0 +1,206 @@
+import os
+import re
+import glob
+import argparse
+
+import yt_dlp
+
+from srt_parser import parse_srt
+
+# === MP3 frame header 表（只處理 Layer III）===
+BITRATES = {
+    'mpeg1': [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    'mpeg2': [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],   # MPEG1
+    2: [22050, 24000, 16000],   # MPEG2
+    0: [11025, 12000, 8000],    # MPEG2.5
+}
+
+# 日文字元：平假名、片假名、長音符、漢字、々
+JAPANESE_RE = re.compile(r'[\u3040-\u30ff\u4e00-\u9fff\u3005]')
+# [音楽]、(拍手) 等非語音的標記
+TAG_RE = re.compile(r'^[\[［(（].*[\]］)）]$')
+
+# 評分權重
+WEIGHTS = {
+    'coverage': 0.4,
+    'japanese': 0.3,
+    'density': 0.2,
+    'rate': 0.1,
+}
+
+# 各項的最低要求，任一項未達到時不論總分都不採用
+MINIMUMS = {
+    'coverage': 0.6,
+    'japanese': 0.6,
+    'density': 0.3,
+    'rate': 1.0,
+}
+
+
+def mp3_duration(mp3_file):
+    """
+    由第一個 frame header 計算 mp3 長度（秒），有 Xing/Info header 時使用其 frame 數
+
+    Returns:
+        長度（秒），無法解析時回傳 None
+    """
+    start = 0
+    with open(mp3_file, 'rb') as f:
+        header = f.read(10)
+        # 跳過 ID3v2 tag
+        if header[:3] == b'ID3' and len(header) == 10:
+            start = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+        f.seek(start)
+        data = f.read(64 * 1024)
+    size = os.path.getsize(mp3_file) - start
+
+    pos = 0
+    while pos + 4 <= len(data):
+        if data[pos] == 0xFF and (data[pos + 1] & 0xE0) == 0xE0:
+            version = (data[pos + 1] >> 3) & 0x03
+            layer = (data[pos + 1] >> 1) & 0x03
+            bitrate_idx = data[pos + 2] >> 4
+            rate_idx = (data[pos + 2] >> 2) & 0x03
+            if version != 1 and layer == 1 and 0 < bitrate_idx < 15 and rate_idx < 3:
+                break
+        pos += 1
+    else:
+        return None
+
+    mpeg1 = version == 3
+    stereo = (data[pos + 3] >> 6) != 3
+    sample_rate = SAMPLE_RATES[version][rate_idx]
+    samples_per_frame = 1152 if mpeg1 else 576
+
+    # Xing/Info header（VBR）
+    side_info = (32 if stereo else 17) if mpeg1 else (17 if stereo else 9)
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 0x01:
+            frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+            return frames * samples_per_frame / sample_rate
+
+    bitrate = BITRATES['mpeg1' if mpeg1 else 'mpeg2'][bitrate_idx] * 1000
+    return (size - pos) * 8 / bitrate
+
+
+def covered_seconds(segments):
+    """
+    字幕時間區間聯集的長度（秒），重疊的字幕（例如自動字幕的滾動顯示）只計算一次
+    """
+    total = 0.0
+    cur_start = cur_end = None
+    for start, end, _ in sorted(segments):
+        end = max(end, start)
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def caption_score(srt_file, duration=None):
+    """
+    評估字幕品質，分數介於 0 到 1
+
+    - coverage：字幕時間區間的聯集佔音檔長度的比例
+    - japanese：非空白字元中日文字元的比例
+    - density：以音檔長度計算的每分鐘字幕段落數，6 段以上為滿分
+    - rate：每秒字數在 2～15 之間為滿分（太少表示漏字，太多表示時間軸錯誤）
+
+    沒有音檔長度時 coverage 與 density 以 0 計，不會達到 MINIMUMS
+
+    Returns:
+        (score, details)
+    """
+    segments = [s for s in parse_srt(srt_file) if s[2] and not TAG_RE.match(s[2])]
+    if not segments:
+        return 0.0, {key: 0.0 for key in WEIGHTS}
+
+    spoken = covered_seconds(segments)
+    chars = [c for s in segments for c in s[2] if not c.isspace()]
+    minutes = duration / 60 if duration else 0
+
+    details = {
+        'coverage': min(spoken / duration, 1.0) if duration else 0.0,
+        'japanese': len(JAPANESE_RE.findall(''.join(chars))) / len(chars) if chars else 0.0,
+        'density': min(len(segments) / minutes / 6, 1.0) if minutes else 0.0,
+        'rate': 1.0 if spoken and 2 <= len(chars) / spoken <= 15 else 0.0,
+    }
+    score = sum(WEIGHTS[key] * value for key, value in details.items())
+    return score, details
+
+
+def below_minimum(details):
+    """
+    取得未達 MINIMUMS 的項目
+    """
+    return [key for key, minimum in MINIMUMS.items() if details.get(key, 0.0) < minimum]
+
+
+def download_captions(video_id, srt_file, lang='ja'):
+    """
+    下載 YouTube 字幕並轉為 srt，有手動字幕時優先使用，沒有時明確要求自動產生的字幕
+
+    Returns:
+        'manual' 或 'auto'，沒有該語言的字幕時回傳 None
+    """
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    # 自動字幕的原始語言可能標示為 <lang>-orig，其餘為翻譯
+    if lang in (info.get('subtitles') or {}):
+        kind, sub_lang = 'manual', lang
+    else:
+        auto = info.get('automatic_captions') or {}
+        sub_lang = next((l for l in (f"{lang}-orig", lang) if l in auto), None)
+        if sub_lang is None:
+            return None
+        kind = 'auto'
+
+    base = os.path.splitext(srt_file)[0]
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'writesubtitles': kind == 'manual',
+        'writeautomaticsub': kind == 'auto',
+        'subtitleslangs': [sub_lang],
+        'subtitlesformat': 'srt/best',
+        # skip_download 時預設的 post_process 階段不會執行，與 yt-dlp CLI 相同改在 before_dl 轉換
+        'postprocessors': [{'key': 'FFmpegSubtitlesConvertor', 'format': 'srt', 'when': 'before_dl'}],
+        'outtmpl': f"{base}.%(ext)s",
+    }
+    written = f"{base}.{sub_lang}.srt"
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.process_ie_result(info, download=True)
+        if not os.path.exists(written):
+            return None
+        os.replace(written, srt_file)
+        return kind
+    finally:
+        # 轉換失敗時留下的 .vtt 等字幕檔也一併刪除
+        for leftover in glob.glob(f"{glob.escape(base)}.{glob.escape(sub_lang)}.*"):
+            os.remove(leftover)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='評估 srt 字幕品質')
+    parser.add_argument('srt_file')
+    parser.add_argument('--mp3', help='對應的 mp3，用於計算涵蓋率與密度')
+    args = parser.parse_args()
+
+    duration = mp3_duration(args.mp3) if args.mp3 else None
+    score, details = caption_score(args.srt_file, duration)
+    failed = below_minimum(details)
+    print(f"score={score:.2f} " + ' '.join(f"{k}={v:.2f}" for k, v in details.items())
+          + (f" below_minimum={','.join(failed)}" if failed else ''))
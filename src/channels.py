@@ -0,0 +1,152 @@
+import os
+import re
+import json
+from datetime import date
+
+# === 設定目錄路徑 ===
+src_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(src_dir)
+
+# 頻道設定檔
+channels_file = os.path.join(src_dir, 'channels.json')
+
+
+def rename_title(title):
+    # Extract the time of day (朝/昼/夜)
+    time_of_day = ""
+    if "朝の" in title:
+        time_of_day = "朝"
+    elif "昼の" in title:
+        time_of_day = "昼"
+    elif "夜の" in title:
+        time_of_day = "夜"
+
+    # Extract the date (月日)
+    date_match = re.search(r'（(\d+)月(\d+)日）', title)
+    if date_match:
+        month = date_match.group(1).zfill(2)
+        day = date_match.group(2).zfill(2)
+        formatted_date = f"{month}-{day}"
+
+        # Construct the new title
+        return f"TBS_News_{formatted_date}_{time_of_day}"
+
+    # Return original title if pattern doesn't match
+    return title
+
+
+def tbs_title_date(title, today=None):
+    """
+    由 TBS_News_MM-DD_* 取得日期；title 沒有年份，晚於今天的日期視為去年
+
+    Returns:
+        'YYYY-MM-DD'，title 不符合時回傳 None
+    """
+    match = re.match(r'TBS_News_(\d{2})-(\d{2})', title)
+    if not match:
+        return None
+    today = today or date.today()
+    month, day = int(match.group(1)), int(match.group(2))
+    year = today.year if (month, day) <= (today.month, today.day) else today.year - 1
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+# === 檔名規則 ===
+# list_title: 更新清單時寫入 CSV 的 title
+# file_title: 由 CSV 的一列決定 mp3/srt/notes 的檔名
+# title_date: 由檔名取得上架日期（'YYYY-MM-DD'），CSV 沒有日期時使用
+NAMING = {
+    'tbs': {
+        'list_title': rename_title,
+        'file_title': lambda row: row['title'],
+        'title_date': tbs_title_date,
+    },
+    'ayano': {
+        'list_title': lambda title: title,
+        'file_title': lambda row: f"ayano_{int(row['idx']):03d}",
+        'title_date': lambda title: None,
+    },
+}
+
+
+# === 各類檔案的目錄與副檔名 ===
+ARTIFACTS = {
+    'mp3': ('mp3_dir', '.mp3'),
+    'srt': ('srt_dir', '.srt'),
+    'notes': ('notes_dir', '.Notes.txt'),
+    'summary': ('summary_dir', '.md'),
+}
+
+
+def load_channels(config_file=channels_file):
+    """
+    讀取頻道設定檔，將相對路徑轉為絕對路徑並補上各目錄
+
+    Returns:
+        (pools, channels): pools 為各共用 pool 的 worker 數量，channels 為頻道設定的 list
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    pools = config.get('pools', {})
+    channels = []
+    for channel in config['channels']:
+        channel = dict(channel)
+        if channel['naming'] not in NAMING:
+            raise ValueError(f"未知的檔名規則 {channel['naming']}（頻道 {channel['name']}）")
+        if channel.get('publish', 'copy') == 'feed' and not config.get('feed', {}).get('base_url'):
+            # feed 中的網址必須能從播放裝置連線，不使用 localhost 作為預設值
+            raise ValueError(f"頻道 {channel['name']} 使用 feed 發佈，channels.json 須設定 feed.base_url")
+
+        base_dir = os.path.join(root_dir, channel['base_dir'])
+        channel['base_dir'] = base_dir
+        channel['csv_file'] = os.path.join(root_dir, channel['csv_file'])
+        channel['mp3_dir'] = os.path.join(base_dir, 'mp3/')
+        channel['srt_dir'] = os.path.join(base_dir, 'srt/')
+        channel['notes_dir'] = os.path.join(base_dir, 'notes/')
+        channel['summary_dir'] = os.path.join(base_dir, 'summary/')
+        channel['manifest_file'] = os.path.join(base_dir, 'manifest.json')
+        channel['index_file'] = os.path.join(base_dir, 'artifact_index.json')
+        channel['state_file'] = os.path.join(base_dir, 'build_state.json')
+        channels.append(channel)
+
+    return pools, channels
+
+
+def file_title(channel, row):
+    """
+    取得某一列影片在該頻道下的檔名（不含副檔名）
+    """
+    return NAMING[channel['naming']]['file_title'](row)
+
+
+def list_title(channel, title):
+    """
+    取得更新清單時寫入 CSV 的 title
+    """
+    return NAMING[channel['naming']]['list_title'](title)
+
+
+def title_date(channel, title):
+    """
+    由檔名取得上架日期（'YYYY-MM-DD'），無法判斷時回傳 None
+    """
+    return NAMING[channel['naming']]['title_date'](title)
+
+
+def artifact_path(channel, title, kind):
+    """
+    取得某個 title 的 mp3、srt、notes 或 summary 檔案路徑
+    """
+    dir_key, suffix = ARTIFACTS[kind]
+    return os.path.join(channel[dir_key], f"{title}{suffix}")
+
+
+def artifact_title(filename):
+    """
+    由檔名取得 (title, kind)，不是 mp3/srt/notes/summary 時回傳 (None, None)
+    """
+    for kind, (_, suffix) in ARTIFACTS.items():
+        if filename.endswith(suffix) and not filename.endswith(f".tmp{suffix}"):
+            return filename[:-len(suffix)], kind
+    return None, None
@@ -1,30 +1,7 @@
 import os
-import re
 import pandas as pd
 from yt_dlp import YoutubeDL
-
-def rename_title(title):
-    # Extract the time of day (朝/昼/夜)
-    time_of_day = ""
-    if "朝の" in title:
-        time_of_day = "朝"
-    elif "昼の" in title:
-        time_of_day = "昼"
-    elif "夜の" in title:
-        time_of_day = "夜"
-    
-    # Extract the date (月日)
-    date_match = re.search(r'（(\d+)月(\d+)日）', title)
-    if date_match:
-        month = date_match.group(1).zfill(2)
-        day = date_match.group(2).zfill(2)
-        formatted_date = f"{month}-{day}"
-        
-        # Construct the new title
-        return f"TBS_News_{formatted_date}_{time_of_day}"
-    
-    # Return original title if pattern doesn't match
-    return title
+from channels import rename_title
 
 # === 設定頻道網址 ===
 channel_url = 'https://www.youtube.com/playlist?list=PLhoNlZaJqDLaPgn1NqC9FxMPnlkemRpyr'
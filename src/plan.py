@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from lib.mylog import setup_logger
+from channels import load_channels, file_title, artifact_path
+import artifact_store
+from run_channels import (ChannelRun, ChannelQueue, round_robin, submit, sync_store, write_notes,
+                          download_one, caption_or_transcribe, transcribe_one, download_srt_one, copy_files)
+from publish_feed import update_feed, load_feed_config
+from retention import publish_window
+
+# 設定 logger
+logger = setup_logger('youtube_update')
+
+# 依拓撲順序排列的節點種類，catalog 中的每一列是所有節點的根
+STAGES = ['notes', 'mp3', 'srt', 'summary', 'published']
+# 重建失敗時記錄的 fingerprint：節點仍在計畫範圍內，且不會把之後出現的舊檔案視為有效
+INVALID = 'invalid'
+
+
+def depends(channel, kind):
+    """
+    取得節點的上游節點種類
+    """
+    if kind == 'srt':
+        # YouTube 字幕直接由影片取得，不依賴 mp3
+        return ['mp3'] if channel['srt_source'] == 'whisper' else []
+    return {
+        'notes': [],
+        'mp3': [],
+        'summary': ['srt'],
+        'published': ['notes', 'mp3', 'srt'],
+    }[kind]
+
+
+def fingerprint(inputs):
+    data = json.dumps(inputs, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def node_inputs(run, row, title, kind):
+    """
+    節點的輸入：catalog 欄位、上游檔案的雜湊值與 channels.json 中的 versions 設定
+
+    更換 whisper 模型等情況，修改 versions 即可讓對應的節點重新產生
+    """
+    channel = run.channel
+    versions = channel.get('versions', {})
+    if kind == 'notes':
+        return [row['url']]
+    if kind == 'mp3':
+        return [row['id'], versions.get('mp3')]
+    if kind == 'srt':
+        source = run.manifest.get(title, 'mp3') if channel['srt_source'] == 'whisper' else row['id']
+        inputs = [source, channel['srt_source'], versions.get('srt')]
+        if srt_origin(run, title) != channel['srt_source']:
+            # whisper 頻道採用了 YouTube 字幕（caption_first）
+            inputs.append(srt_origin(run, title))
+        return inputs
+    if kind == 'summary':
+        return [run.manifest.get(title, 'srt'), versions.get('summary')]
+    return [row['url'], run.manifest.get(title, 'mp3'), run.manifest.get(title, 'srt'),
+            channel.get('publish', 'copy'), channel['google_dir']]
+
+
+def srt_origin(run, title):
+    """
+    目前的 srt 實際的來源：'whisper' 或 'youtube'
+    """
+    info = run.index.get(title, 'srt')
+    return (info or {}).get('source', run.channel['srt_source'])
+
+
+def output_exists(run, title, kind, row=None):
+    """
+    輸出是否存在；notes 內容與 catalog 的網址不符時視為不存在
+    """
+    if kind == 'notes' and row is not None:
+        path = artifact_path(run.channel, title, kind)
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() == row['url']
+    if kind == 'published':
+        info = run.index.get(title, 'mp3')
+        return bool(info and info.get('published'))
+    return os.path.exists(artifact_path(run.channel, title, kind))
+
+
+def is_wanted(run, title, kind, exists, stored, publish_titles):
+    """
+    判斷節點是否在計畫範圍內，避免把 catalog 中從未下載過的舊影片全部重建
+
+    - notes：一律需要
+    - mp3/srt：已存在、曾經產生過，或（whisper 字幕）mp3 已存在；被 retention 刪除的不需要
+    - summary：不在這裡產生，只處理已存在的檔案
+    - published：在發佈範圍內且 mp3 已存在
+    """
+    channel = run.channel
+    if kind == 'notes':
+        return True
+    if kind in ('mp3', 'srt'):
+        if run.index.is_evicted(title, kind):
+            return False
+        if exists or stored is not None or run.manifest.get(title, kind):
+            return True
+        return (kind == 'srt' and channel['srt_source'] == 'whisper'
+                and os.path.exists(artifact_path(channel, title, 'mp3')))
+    if kind == 'summary':
+        return exists
+    return title in publish_titles and os.path.exists(artifact_path(channel, title, 'mp3'))
+
+
+def plan_channel(run, state, force=(), pattern=None):
+    """
+    一次走訪 catalog，算出需要重建的節點
+
+    節點在下列情況需要重建：輸出不存在、指定 force、儲存的 fingerprint 與目前輸入不同，
+    或上游節點需要重建（執行時上游完成後會再比對一次 fingerprint）。
+    已存在但沒有 fingerprint 的輸出視為由目前的輸入產生，直接記錄；
+    上次重建失敗（fingerprint 為 INVALID）的輸出一律重建。
+
+    Returns:
+        {kind: [(label, title, reason)]}，reason 為 'missing'、'force'、'changed' 或 'upstream'
+    """
+    channel = run.channel
+    publish_titles = publish_window(channel, run.df)
+
+    plan = {kind: [] for kind in STAGES}
+    for label, row in run.df.iterrows():
+        title = file_title(channel, row)
+        if pattern and not fnmatch.fnmatch(title, pattern):
+            continue
+
+        dirty = set()
+        for kind in STAGES:
+            exists = output_exists(run, title, kind, row)
+            stored = state.get(title, kind)
+            if not is_wanted(run, title, kind, exists, stored, publish_titles):
+                continue
+
+            current = fingerprint(node_inputs(run, row, title, kind))
+            if kind in force:
+                reason = 'force'
+            elif not exists:
+                reason = 'missing'
+            elif stored is not None and stored != current:
+                reason = 'changed'
+            elif any(dep in dirty for dep in depends(channel, kind)):
+                reason = 'upstream'
+            else:
+                if stored is None:
+                    state.set(title, kind, current)
+                continue
+
+            dirty.add(kind)
+            plan[kind].append((label, title, reason))
+
+    return plan
+
+
+def remove_output(run, title, kind):
+    """
+    刪除要重建的輸出（store 中的 blob 保留，內容不變時可直接重用）
+    """
+    path = artifact_path(run.channel, title, kind)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def rebuild_srt(fn, run, row, title, *args):
+    """
+    在工作開始時才刪除舊的 srt（產生字幕的函式遇到已存在的 srt 會直接跳過），
+    排隊中的工作沒有執行時舊的字幕仍然保留
+    """
+    remove_output(run, title, 'srt')
+    fn(run, row, title, *args)
+
+
+def rebuilt(run, title, kind, since):
+    """
+    節點是否在 since 之後重建成功；mp3/srt 在新檔案完成前保留舊檔案，
+    所以以 index 的 added 時間判斷，不能只看檔案是否存在
+    """
+    if kind in ('mp3', 'srt'):
+        info = run.index.get(title, kind)
+        return bool(info and info['added'] >= since and output_exists(run, title, kind))
+    return output_exists(run, title, kind)
+
+
+def build_tasks(run, kind, nodes, dl_pool, tr_pool):
+    """
+    產生某一層節點的工作：(pool, fn, args...)，對 YouTube 的請求以頻道的 ChannelQueue 取代 pool
+    """
+    channel = run.channel
+    tasks = []
+    if kind == 'notes':
+        for _, title, _ in nodes:
+            remove_output(run, title, kind)
+        tasks.append((dl_pool, write_notes, channel, run.df.loc[[label for label, _, _ in nodes]]))
+    elif kind == 'mp3':
+        # download_one 先下載到臨時檔案再取代，舊的 mp3 保留到新檔案完成
+        for label, title, _ in nodes:
+            tasks.append((run.queue, download_one, run, run.df.loc[label], title))
+    elif kind == 'srt':
+        for label, title, _ in nodes:
+            if channel['srt_source'] == 'whisper':
+                # 目前的字幕已經是 YouTube 字幕時，重建一律改用 whisper；
+                # 否則 caption_first 的頻道經過 ChannelQueue 先嘗試 YouTube 字幕
+                if channel.get('caption_first') and srt_origin(run, title) != 'youtube':
+                    tasks.append((run.queue, rebuild_srt, caption_or_transcribe,
+                                  run, run.df.loc[label], title, tr_pool))
+                else:
+                    tasks.append((tr_pool, rebuild_srt, transcribe_one, run, run.df.loc[label], title))
+            else:
+                tasks.append((run.queue, rebuild_srt, download_srt_one, run, run.df.loc[label], title))
+    elif kind == 'summary':
+        # 摘要由外部產生，過期的摘要直接刪除，等待重新產生
+        for _, title, _ in nodes:
+            remove_output(run, title, kind)
+            logger.info(f"[{channel['name']}] plan: 刪除過期摘要 {title}")
+    elif kind == 'published':
+        if channel.get('publish', 'copy') == 'feed':
+            tasks.append((dl_pool, update_feed, channel, run.df, run.manifest,
+                          load_feed_config()['base_url'], run.index))
+        else:
+            # 先刪除 google_dir 中過期的檔案，copy_files 才會重新複製
+            for _, title, _ in nodes:
+                for artifact in ('mp3', 'notes', 'srt'):
+                    dst_file = os.path.join(channel['google_dir'],
+                                            os.path.basename(artifact_path(channel, title, artifact)))
+                    if os.path.exists(dst_file):
+                        os.remove(dst_file)
+            tasks.append((dl_pool, copy_files, run))
+    return tasks
+
+
+def still_dirty(run, state, label, title, kind, reason):
+    """
+    上游完成後再比對一次：上游重建後內容沒變時，不需要重建下游
+    """
+    if reason != 'upstream':
+        return True
+    current = fingerprint(node_inputs(run, run.df.loc[label], title, kind))
+    return state.get(title, kind) != current
+
+
+def execute(plans, pools, dry_run=False):
+    """
+    依拓撲順序逐層執行計畫，同一層的節點在共用 pool 中平行處理
+
+    Args:
+        plans: [(run, state, plan)]
+    """
+    dl_pool = ThreadPoolExecutor(max_workers=pools.get('download', 2))
+    tr_pool = ThreadPoolExecutor(max_workers=pools.get('transcribe', 1))
+    for run, _, _ in plans:
+        run.open_queue(dl_pool)
+    try:
+        for kind in STAGES:
+            started = time.time()
+            task_lists = []
+            for run, state, plan in plans:
+                nodes = plan[kind]
+                if not dry_run:
+                    nodes = [(label, title, reason) for label, title, reason in nodes
+                             if still_dirty(run, state, label, title, kind, reason)]
+                    plan[kind] = nodes
+                for label, title, reason in nodes:
+                    logger.info(f"[{run.channel['name']}] plan: {kind} {title}（{reason}）")
+                if nodes and not dry_run:
+                    task_lists.append(build_tasks(run, kind, nodes, dl_pool, tr_pool))
+
+            futures = []
+            for pool, fn, *args in round_robin(task_lists):
+                if isinstance(pool, ChannelQueue):
+                    pool.put(fn, *args)
+                else:
+                    futures.append(submit(pool, fn, *args))
+            wait(futures)
+            for run, _, _ in plans:
+                run.queue.wait()
+                # 字幕品質不足時由佇列中的工作排入的 whisper
+                wait(run.transcriptions)
+
+            if dry_run:
+                continue
+            # 記錄完成的節點的 fingerprint
+            for run, state, plan in plans:
+                for label, title, _ in plan[kind]:
+                    if rebuilt(run, title, kind, started):
+                        state.set(title, kind, fingerprint(node_inputs(run, run.df.loc[label], title, kind)))
+                    elif kind == 'summary':
+                        # 摘要由外部重新產生，產生後直接採用
+                        state.remove(title, kind)
+                    else:
+                        state.set(title, kind, INVALID)
+    finally:
+        dl_pool.shutdown(wait=True)
+        tr_pool.shutdown(wait=True)
+
+
+def main(names=None, force=(), pattern=None, dry_run=False):
+    pools, channels = load_channels()
+    plans = []
+    for channel in channels:
+        if names and channel['name'] not in names:
+            continue
+        run = ChannelRun(channel, pd.read_csv(channel['csv_file']))
+        if not dry_run:
+            # dry-run 不修改任何檔案，可由 store 還原的檔案會列為 missing
+            sync_store(run)
+        state = artifact_store.Manifest(channel['state_file'])
+        plans.append((run, state, plan_channel(run, state, force, pattern)))
+
+    total = sum(len(nodes) for _, _, plan in plans for nodes in plan.values())
+    logger.info(f"plan: 共 {total} 個節點需要重建")
+    execute(plans, pools, dry_run)
+    if dry_run:
+        return
+
+    for run, state, _ in plans:
+        run.manifest.save()
+        run.index.save()
+        state.save()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='計算並執行最少的重建工作（catalog → notes → mp3 → srt → summary → published）')
+    parser.add_argument('--channel', action='append', help='只處理指定的頻道（可重複）')
+    parser.add_argument('--force', action='append', default=[], choices=STAGES, help='強制重建指定種類的節點（可重複）')
+    parser.add_argument('--title', help='只處理符合的 title（支援萬用字元，例如 TBS_News_04-*）')
+    parser.add_argument('--dry-run', action='store_true', help='只列出計畫，不執行')
+    args = parser.parse_args()
+    main(args.channel, set(args.force), args.title, args.dry_run)
@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import argparse
+import mimetypes
+from urllib.parse import quote, unquote, urlsplit
+from email.utils import formatdate, parsedate_to_datetime
+from xml.sax.saxutils import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pandas as pd
+
+from lib.mylog import setup_logger
+from channels import channels_file, load_channels, file_title, artifact_path, ARTIFACTS
+import artifact_store
+
+# 設定 logger
+logger = setup_logger('youtube_update')
+
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.srt': 'application/x-subrip; charset=utf-8',
+    '.txt': 'text/plain; charset=utf-8',
+    '.xml': 'application/rss+xml; charset=utf-8',
+}
+
+
+def load_feed_config(config_file=channels_file):
+    """
+    讀取 channels.json 中的 feed 設定（base_url、host、port）
+
+    base_url 沒有預設值，未設定時為 None
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        feed = json.load(f).get('feed', {})
+    feed.setdefault('host', '0.0.0.0')
+    feed.setdefault('port', 8000)
+    feed['base_url'] = (feed.get('base_url') or '').rstrip('/') or None
+    return feed
+
+
+def feed_dir(channel):
+    return os.path.join(channel['base_dir'], 'feed/')
+
+
+def access_log_file(channel):
+    """
+    伺服器的存取紀錄，每行為「時間<TAB>kind<TAB>title」，由 retention 讀取
+    """
+    return os.path.join(feed_dir(channel), 'access.log')
+
+
+def media_url(base_url, channel, title, kind):
+    filename = os.path.basename(artifact_path(channel, title, kind))
+    return f"{base_url}/{quote(channel['name'])}/{kind}/{quote(filename)}"
+
+
+def item_fingerprint(channel, row, title, base_url, digest):
+    """
+    決定 item 是否需要重新產生：mp3 內容、字幕是否存在、網址與 base_url
+    """
+    mp3_file = artifact_path(channel, title, 'mp3')
+    stat = os.stat(mp3_file)
+    return [digest or f"{stat.st_size}-{int(stat.st_mtime)}",
+            os.path.exists(artifact_path(channel, title, 'srt')),
+            row['url'], base_url]
+
+
+def pub_date(row, mp3_file):
+    """
+    以上架日期作為 pubDate，沒有日期時使用 mp3 的修改時間
+    """
+    date = str(row.get('date', 'unknown'))
+    try:
+        if date not in ('unknown', 'nan'):
+            return formatdate(pd.Timestamp(date).timestamp(), usegmt=True)
+    except ValueError:
+        pass
+    return formatdate(os.path.getmtime(mp3_file), usegmt=True)
+
+
+def build_item(channel, row, title, base_url):
+    """
+    產生單一集數的 RSS <item>
+    """
+    mp3_file = artifact_path(channel, title, 'mp3')
+    description = row['url']
+    if os.path.exists(artifact_path(channel, title, 'srt')):
+        description += f"\n{media_url(base_url, channel, title, 'srt')}"
+
+    return (
+        "<item>"
+        f"<title>{escape(title)}</title>"
+        f"<guid isPermaLink=\"false\">{escape(str(row['id']))}</guid>"
+        f"<link>{escape(row['url'])}</link>"
+        f"<description>{escape(description)}</description>"
+        f"<pubDate>{pub_date(row, mp3_file)}</pubDate>"
+        f"<enclosure url=\"{escape(media_url(base_url, channel, title, 'mp3'))}\" "
+        f"length=\"{os.path.getsize(mp3_file)}\" type=\"audio/mpeg\"/>"
+        "</item>"
+    )
+
+
+def update_feed(channel, df, manifest=None, base_url=None, index=None):
+    """
+    依清單產生頻道的 feed.xml，只重新產生有變更的 item
+
+    已產生的 item 與其 fingerprint 存在 feed/items.json，
+    組合後內容沒有變化時不會改寫 feed.xml。
+    有傳入 index 時，feed 中的 mp3/srt 會標記為已發佈
+
+    Returns:
+        重新產生的 item 數量
+    """
+    base_url = base_url or load_feed_config()['base_url']
+    if not base_url:
+        raise ValueError(f"[{channel['name']}] update_feed: 未設定 feed.base_url")
+    out_dir = feed_dir(channel)
+    os.makedirs(out_dir, exist_ok=True)
+    cache_file = os.path.join(out_dir, 'items.json')
+    feed_file = os.path.join(out_dir, 'feed.xml')
+
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        cache = {}
+
+    if channel.get('publish_last'):
+        df = df.tail(channel['publish_last'])
+
+    items = []
+    new_cache = {}
+    rebuilt_count = 0
+    # 由新到舊排列
+    for _, row in df.iloc[::-1].iterrows():
+        title = file_title(channel, row)
+        if not os.path.exists(artifact_path(channel, title, 'mp3')):
+            continue
+        digest = manifest.get(title, 'mp3') if manifest else None
+        fingerprint = item_fingerprint(channel, row, title, base_url, digest)
+        cached = cache.get(title)
+        if cached and cached['fingerprint'] == fingerprint:
+            xml = cached['xml']
+        else:
+            xml = build_item(channel, row, title, base_url)
+            rebuilt_count += 1
+        new_cache[title] = {'fingerprint': fingerprint, 'xml': xml}
+        items.append(xml)
+        if index is not None:
+            index.mark_published(title, 'mp3')
+            index.mark_published(title, 'srt')
+
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0"><channel>'
+        f"<title>{escape(channel['name'])}</title>"
+        f"<link>{escape(channel['channel_url'])}</link>"
+        f"<description>{escape(channel['name'])}</description>"
+        + ''.join(items) +
+        '</channel></rss>\n'
+    )
+
+    try:
+        with open(feed_file, 'r', encoding='utf-8') as f:
+            unchanged = f.read() == content
+    except FileNotFoundError:
+        unchanged = False
+
+    if not unchanged:
+        for path, data in ((feed_file, content),
+                           (cache_file, json.dumps(new_cache, ensure_ascii=False))):
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+        logger.info(f"[{channel['name']}] update_feed: 重新產生 {rebuilt_count} 個項目，共 {len(items)} 個")
+
+    return rebuilt_count
+
+
+def parse_range(header, size):
+    """
+    解析單一 bytes range，回傳 (start, end)（含 end）
+
+    Returns:
+        None 表示忽略 Range（格式錯誤、end 小於 start 或多段 range），
+        'invalid' 表示範圍無法滿足（416）
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    if size == 0:
+        # 空檔案沒有可滿足的 range
+        return 'invalid'
+    start, _, end = header[6:].strip().partition('-')
+    try:
+        if start == '':
+            # bytes=-N：最後 N 個位元組
+            length = int(end)
+            if length < 0:
+                return None
+            if length == 0:
+                return 'invalid'
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return 'invalid'
+    if end < start:
+        # RFC 7233：last-byte-pos 小於 first-byte-pos 時 range 無效，忽略 Range
+        return None
+    return start, min(end, size - 1)
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """
+    提供 /<頻道>/<mp3|srt|notes>/<檔名> 與 /<頻道>/feed.xml
+
+    支援 Range、If-None-Match、If-Modified-Since，並以 sendfile 傳送內容
+    """
+
+    channels = {}
+    protocol_version = 'HTTP/1.1'
+
+    def resolve(self):
+        """
+        Returns:
+            (channel, kind, path)，kind 為 'feed'、'mp3'、'srt' 或 'notes'；無效路徑回傳 None
+        """
+        parts = [unquote(p) for p in urlsplit(self.path).path.split('/') if p]
+        if not parts or parts[0] not in self.channels:
+            return None
+        channel = self.channels[parts[0]]
+        if parts[1:] == ['feed.xml']:
+            return channel, 'feed', os.path.join(feed_dir(channel), 'feed.xml')
+        if len(parts) != 3 or parts[1] not in ARTIFACTS:
+            return None
+        filename = parts[2]
+        # 不允許路徑跳脫
+        if os.path.basename(filename) != filename or filename.startswith('.'):
+            return None
+        dir_path = os.path.dirname(artifact_path(channel, '', parts[1]))
+        return channel, parts[1], os.path.join(dir_path, filename)
+
+    def send_empty(self, code, headers=()):
+        self.send_response(code)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        resolved = self.resolve()
+        if resolved is None or not os.path.isfile(resolved[2]):
+            self.send_empty(404)
+            return
+        channel, kind, path = resolved
+
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{size:x}-{int(stat.st_mtime):x}"'
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+            common = [('ETag', etag), ('Last-Modified', last_modified), ('Accept-Ranges', 'bytes')]
+
+            if self.not_modified(etag, stat.st_mtime):
+                self.send_empty(304, common)
+                return
+
+            byte_range = parse_range(self.headers.get('Range'), size)
+            if_range = self.headers.get('If-Range')
+            if if_range and if_range not in (etag, last_modified):
+                byte_range = None
+            if byte_range == 'invalid':
+                self.send_empty(416, common + [('Content-Range', f"bytes */{size}")])
+                return
+
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+
+            ext = os.path.splitext(path)[1]
+            content_type = CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(end - start + 1 if size else 0))
+            for key, value in common:
+                self.send_header(key, value)
+            self.end_headers()
+
+            if send_body and size:
+                # socket.sendfile 在支援的平台上使用 os.sendfile，不經過 user space
+                self.connection.sendfile(f, start, end - start + 1)
+                if kind in ('mp3', 'srt'):
+                    self.record_access(channel, kind, path)
+
+    def record_access(self, channel, kind, path):
+        """
+        記錄檔案被存取的時間，供 retention 依 LRU 清理
+        """
+        title = os.path.basename(path)[:-len(ARTIFACTS[kind][1])]
+        try:
+            os.makedirs(feed_dir(channel), exist_ok=True)
+            with open(access_log_file(channel), 'a', encoding='utf-8') as f:
+                f.write(f"{time.time()}\t{kind}\t{title}\n")
+        except OSError as e:
+            logger.error(f"serve: 寫入存取紀錄失敗: {str(e)}")
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            # If-None-Match 使用弱比較，W/ 前綴不影響結果
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, format, *args):
+        logger.info(f"serve: {self.address_string()} {format % args}")
+
+
+def serve(channels, host, port):
+    """
+    啟動本地 HTTP 伺服器，提供各頻道的 feed 與 mp3/srt/notes
+    """
+    MediaHandler.channels = {c['name']: c for c in channels}
+    server = ThreadingHTTPServer((host, port), MediaHandler)
+    logger.info(f"serve: http://{host}:{port}/<頻道>/feed.xml")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='產生 podcast feed 或啟動本地媒體伺服器')
+    parser.add_argument('--serve', action='store_true', help='啟動 HTTP 伺服器')
+    parser.add_argument('--channel', action='append', help='只處理指定的頻道（可重複）')
+    args = parser.parse_args()
+
+    feed_config = load_feed_config()
+    _, channels = load_channels()
+    if args.channel:
+        channels = [c for c in channels if c['name'] in args.channel]
+
+    if args.serve:
+        serve(channels, feed_config['host'], feed_config['port'])
+    else:
+        for channel in channels:
+            manifest = artifact_store.Manifest(channel['manifest_file'])
+            update_feed(channel, pd.read_csv(channel['csv_file']), manifest, feed_config['base_url'])
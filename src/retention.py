@@ -0,0 +1,183 @@
+import os
+import time
+import argparse
+
+import pandas as pd
+
+from lib.mylog import setup_logger
+from channels import load_channels, file_title, artifact_path
+from publish_feed import access_log_file
+import artifact_store
+
+# 設定 logger
+logger = setup_logger('youtube_update')
+
+DAY = 24 * 60 * 60
+
+
+def fold_access_log(channel, index):
+    """
+    將本地伺服器的存取紀錄併入 index 的 accessed 時間
+
+    先把 access.log 改名再讀取，伺服器之後的寫入會進到新的檔案
+    """
+    log_file = access_log_file(channel)
+    processing_file = f"{log_file}.processing"
+    if os.path.exists(log_file):
+        os.replace(log_file, processing_file)
+    if not os.path.exists(processing_file):
+        return
+
+    with open(processing_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 3:
+                continue
+            when, kind, title = parts
+            try:
+                when = float(when)
+            except ValueError:
+                continue
+            info = index.get(title, kind)
+            if info and (info.get('accessed') or 0) < when:
+                index.touch(title, kind, when)
+    os.remove(processing_file)
+
+
+def publish_window(channel, df):
+    """
+    會被發佈的 title（publish_last 範圍內），範圍外的檔案永遠不會被標記為已發佈
+    """
+    publish_df = df.tail(channel['publish_last']) if channel.get('publish_last') else df
+    return {file_title(channel, row) for _, row in publish_df.iterrows()}
+
+
+def is_protected(policy, title, kind, index, keep_titles, publish_titles):
+    """
+    keep_last 範圍內，或設定 keep_until_published 且尚未轉錄/發佈的檔案不可刪除
+
+    不在發佈範圍內的檔案不需要等待發佈，但仍要等待轉錄
+    """
+    if title in keep_titles:
+        return True
+    if not policy.get('keep_until_published'):
+        return False
+    if title in publish_titles and not index.get(title, kind).get('published'):
+        return True
+    # mp3 還要等到字幕產生後才能刪除
+    return kind == 'mp3' and index.get(title, 'srt') is None
+
+
+def plan_evictions(channel, df, index, kind, policy, now=None):
+    """
+    依 policy 找出要刪除的 title，順序為：超過 max_age 的檔案，
+    接著依 LRU（最後存取時間，沒有存取時用建立時間）刪除到低於 max_bytes
+
+    Returns:
+        要刪除的 title list
+    """
+    now = now or time.time()
+    keep_last = policy.get('keep_last') or 0
+    keep_titles = {file_title(channel, row) for _, row in df.tail(keep_last).iterrows()} if keep_last else set()
+    publish_titles = publish_window(channel, df)
+
+    entries = [(title, kinds[kind]) for title, kinds in index.items()
+               if kind in kinds and not kinds[kind].get('evicted')]
+    total_bytes = sum(info['size'] for _, info in entries)
+
+    evict = []
+    candidates = []
+    max_age = policy.get('max_age_days')
+    for title, info in entries:
+        if is_protected(policy, title, kind, index, keep_titles, publish_titles):
+            continue
+        if max_age is not None and now - info['added'] > max_age * DAY:
+            evict.append(title)
+            total_bytes -= info['size']
+        else:
+            candidates.append((info.get('accessed') or info['added'], title, info['size']))
+
+    max_bytes = policy.get('max_bytes')
+    if max_bytes is not None:
+        for _, title, size in sorted(candidates):
+            if total_bytes <= max_bytes:
+                break
+            evict.append(title)
+            total_bytes -= size
+
+    return evict
+
+
+def apply_retention(channel, df, manifest, index, dry_run=False):
+    """
+    依頻道的 retention 設定刪除本地 mp3/srt，只讀取 artifact index，不掃描目錄
+
+    設定格式（channels.json）：
+        "retention": {"mp3": {"max_bytes": ..., "max_age_days": ..., "keep_last": N,
+                              "keep_until_published": true}, "srt": {...}}
+
+    Returns:
+        釋放的位元組數
+    """
+    policies = channel.get('retention') or {}
+    if not policies:
+        return 0
+
+    fold_access_log(channel, index)
+
+    reclaimed = 0
+    for kind, policy in policies.items():
+        evict = plan_evictions(channel, df, index, kind, policy)
+        for title in evict:
+            path = artifact_path(channel, title, kind)
+            if dry_run:
+                reclaimed += index.get(title, kind)['size']
+                logger.info(f"[{channel['name']}] retention: 將刪除 {os.path.basename(path)}")
+                continue
+            try:
+                reclaimed += artifact_store.release(path, manifest.get(title, kind))
+                # 保留 manifest 與 index 紀錄，標記為已刪除，避免之後被還原或重新下載
+                index.update(title, kind, evicted=True)
+                logger.info(f"[{channel['name']}] retention: 已刪除 {os.path.basename(path)}")
+            except Exception as e:
+                logger.error(f"[{channel['name']}] retention: 刪除失敗 {path}: {str(e)}")
+
+    if reclaimed > 0:
+        action = '可釋放' if dry_run else '已釋放'
+        logger.info(f"[{channel['name']}] retention: {action} {reclaimed / 1024 / 1024:.1f} MB")
+    return reclaimed
+
+
+def collect_garbage():
+    """
+    以所有頻道（不只本次執行的頻道）的 manifest 決定 store 中哪些 blob 仍需保留
+    """
+    _, channels = load_channels()
+    references = set()
+    for channel in channels:
+        references |= artifact_store.live_digests(artifact_store.Manifest(channel['manifest_file']),
+                                                  artifact_store.ArtifactIndex(channel['index_file']))
+    removed, reclaimed = artifact_store.gc(references)
+    if removed > 0:
+        logger.info(f"gc: 刪除 {removed} 個未使用的 blob，釋放 {reclaimed / 1024 / 1024:.1f} MB")
+    return reclaimed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='依 retention 設定清理本地 mp3/srt')
+    parser.add_argument('--channel', action='append', help='只處理指定的頻道（可重複）')
+    parser.add_argument('--dry-run', action='store_true', help='只列出要刪除的檔案，不執行 gc')
+    args = parser.parse_args()
+
+    _, channels = load_channels()
+    total = 0
+    for channel in channels:
+        if args.channel and channel['name'] not in args.channel:
+            continue
+        manifest = artifact_store.Manifest(channel['manifest_file'])
+        index = artifact_store.ArtifactIndex(channel['index_file'])
+        total += apply_retention(channel, pd.read_csv(channel['csv_file']), manifest, index, args.dry_run)
+        index.save()
+    if not args.dry_run:
+        total += collect_garbage()
+    logger.info(f"retention: 合計 {total / 1024 / 1024:.1f} MB")
@@ -0,0 +1,615 @@
+import os
+import time
+import argparse
+import threading
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.mytube import get_video_list, download_mp3_file, download_subtitle, transcribe_audio
+from lib.mylog import setup_logger
+from channels import load_channels, file_title, list_title, artifact_path, artifact_title
+import artifact_store
+from publish_feed import update_feed, load_feed_config
+from retention import apply_retention, collect_garbage
+from transcript_store import record_transcript, compact
+from caption_check import caption_score, below_minimum, download_captions, mp3_duration
+
+# 設定 logger
+logger = setup_logger('youtube_update')
+
+
+def round_robin(task_lists):
+    """
+    將各頻道的工作清單輪流交錯排列，讓共用 pool 公平地處理每個頻道
+    """
+    tasks = []
+    task_lists = [list(lst) for lst in task_lists]
+    while any(task_lists):
+        for lst in task_lists:
+            if lst:
+                tasks.append(lst.pop(0))
+    return tasks
+
+
+def submit(pool, fn, *args):
+    """
+    送出工作到 pool，工作中未被處理的例外會寫入日誌
+    """
+    def log_exception(future):
+        e = future.exception()
+        if e is not None:
+            logger.error(f"{fn.__name__}: 未預期的錯誤: {str(e)}")
+
+    future = pool.submit(fn, *args)
+    future.add_done_callback(log_exception)
+    return future
+
+
+def upload_date(video):
+    """
+    取得上架日期（YYYYMMDD），播放清單的簡略資訊沒有 upload_date 時改用 timestamp
+    """
+    if video.get('upload_date'):
+        return video['upload_date']
+    timestamp = video.get('timestamp') or video.get('release_timestamp')
+    if timestamp:
+        return time.strftime('%Y%m%d', time.gmtime(timestamp))
+    return 'unknown'
+
+
+def update_list(channel):
+    """
+    取得頻道影片清單，將新影片加到 CSV 的最後面
+    """
+    videos = get_video_list(channel['channel_url'])
+    # === 建立新影片的DataFrame ===
+    new_videos = []
+    for video in videos:
+        # 過濾掉時間過長的影片或live影片
+        duration = video.get('duration')
+        if duration is None or duration > channel['max_duration']:
+            continue
+
+        video_id = video.get('id')
+        new_videos.append({
+            'id': video_id,
+            'title': list_title(channel, video.get('title')),
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'date': upload_date(video)
+        })
+
+    # === 讀取現有的CSV檔案 ===
+    try:
+        existing_df = pd.read_csv(channel['csv_file'])
+        last_idx = existing_df['idx'].max()
+    except FileNotFoundError:
+        existing_df = pd.DataFrame(columns=['idx', 'id', 'title', 'url', 'date'])
+        last_idx = 0
+
+    if not new_videos:
+        logger.info(f"[{channel['name']}] 沒有新影片")
+        return existing_df
+
+    new_df = pd.DataFrame(new_videos).sort_values(by='title', ascending=True)
+
+    # === 比較並合併新舊資料 ===
+    new_videos_mask = ~new_df['id'].isin(existing_df['id'])
+    if not new_videos_mask.any():
+        logger.info(f"[{channel['name']}] 沒有新影片")
+        return existing_df
+
+    new_videos_df = new_df[new_videos_mask].copy()
+    new_videos_count = len(new_videos_df)
+    new_videos_df['idx'] = range(last_idx + 1, last_idx + new_videos_count + 1)
+
+    combined_df = pd.concat([existing_df, new_videos_df], ignore_index=True)
+    combined_df.to_csv(channel['csv_file'], index=False)
+    logger.info(f"[{channel['name']}] 已更新 {new_videos_count} 部新影片")
+    return combined_df
+
+
+def load_list(channel):
+    """
+    依設定更新或直接讀取頻道的 CSV 清單
+    """
+    if channel['update_list']:
+        return update_list(channel)
+    return pd.read_csv(channel['csv_file'])
+
+
+def write_notes(channel, df):
+    """
+    為每個影片建立 notes 文件，內容為 YouTube URL
+    如果文件已存在且內容相同則跳過，內容不符（例如檔名規則改變）時重新寫入
+    """
+    os.makedirs(channel['notes_dir'], exist_ok=True)
+
+    created_count = 0
+    for _, row in df.iterrows():
+        notes_file = os.path.join(channel['notes_dir'], f"{file_title(channel, row)}.Notes.txt")
+        if os.path.exists(notes_file):
+            with open(notes_file, 'r', encoding='utf-8') as f:
+                if f.read().strip() == row['url']:
+                    continue
+            logger.warning(f"筆記文件內容不符，重新寫入：{notes_file}")
+        try:
+            with open(notes_file, 'w', encoding='utf-8') as f:
+                f.write(row['url'])
+            created_count += 1
+            logger.info(f"已建立筆記文件：{notes_file}")
+        except Exception as e:
+            logger.error(f"建立筆記文件失敗 {notes_file}: {str(e)}")
+
+    if created_count > 0:
+        logger.info(f"[{channel['name']}] write_notes: 完成 {created_count} 個筆記文件")
+
+
+def ordered_rows(channel, df):
+    """
+    依頻道設定決定處理順序（由新到舊或由舊到新）
+    """
+    rows = [row for _, row in df.iterrows()]
+    if channel['newest_first']:
+        rows.reverse()
+    return rows
+
+
+class ChannelQueue:
+    """
+    單一頻道對 YouTube 的請求佇列（mp3 與字幕下載）
+
+    同時最多 max_concurrent_downloads 個工作在共用的下載 pool 中執行，
+    每個工作結束後間隔 download_delay 秒才釋放名額；等待由 timer 處理，不佔用 pool 的 worker
+    """
+
+    def __init__(self, pool, channel):
+        self.pool = pool
+        self.max_concurrent = channel.get('max_concurrent_downloads', 1)
+        self.delay = channel.get('download_delay', 0)
+        self.pending = deque()
+        self.running = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Event()
+        self.idle.set()
+
+    def put(self, fn, *args):
+        with self.lock:
+            self.pending.append((fn, args))
+            self.idle.clear()
+        self.dispatch()
+
+    def dispatch(self):
+        # 在 lock 外送出工作，已完成的 future 會同步呼叫 callback
+        tasks = []
+        with self.lock:
+            while self.pending and self.running < self.max_concurrent:
+                tasks.append(self.pending.popleft())
+                self.running += 1
+        for fn, args in tasks:
+            submit(self.pool, fn, *args).add_done_callback(self.finished)
+
+    def finished(self, future):
+        if self.delay:
+            timer = threading.Timer(self.delay, self.release)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.release()
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+            if not self.pending and self.running == 0:
+                self.idle.set()
+        self.dispatch()
+
+    def wait(self):
+        self.idle.wait()
+
+
+class ChannelRun:
+    """
+    單一頻道在一次執行中的狀態：清單、manifest、artifact index、剩餘的字幕額度、是否已停止下載，
+    以及字幕品質不足後排入的 whisper 工作
+    """
+
+    def __init__(self, channel, df):
+        self.channel = channel
+        self.df = df
+        self.manifest = artifact_store.Manifest(channel['manifest_file'])
+        self.index = artifact_store.ArtifactIndex(channel['index_file'])
+        self.srt_budget = channel['max_srt']
+        self.download_failed = False
+        self.queue = None
+        self.transcriptions = []
+        self.lock = threading.Lock()
+
+    def open_queue(self, pool):
+        """
+        建立此頻道在共用下載 pool 上的請求佇列
+        """
+        self.queue = ChannelQueue(pool, self.channel)
+        return self.queue
+
+    def take_srt_budget(self):
+        with self.lock:
+            if self.srt_budget <= 0:
+                return False
+            self.srt_budget -= 1
+            return True
+
+
+def record_artifact(run, title, kind):
+    """
+    將產生的 mp3/srt 放入 artifact store 並記錄到 manifest
+    """
+    path = artifact_path(run.channel, title, kind)
+    try:
+        run.manifest.set(title, kind, artifact_store.put(path))
+        run.index.add(title, kind, os.path.getsize(path))
+    except Exception as e:
+        logger.error(f"[{run.channel['name']}] 放入 store 失敗 {path}: {str(e)}")
+
+
+def sync_store(run):
+    """
+    讓 mp3/srt 目錄與 manifest 一致：
+    manifest 有記錄但本地缺少的檔案由 store 還原，本地有但未記錄的檔案放入 store
+    """
+    channel = run.channel
+    restored_count = 0
+    for title, kinds in run.manifest.items():
+        for kind, digest in kinds.items():
+            path = artifact_path(channel, title, kind)
+            if run.index.is_evicted(title, kind):
+                continue
+            if not os.path.exists(path) and artifact_store.materialize(digest, path):
+                run.index.add(title, kind, os.path.getsize(path))
+                restored_count += 1
+
+    added_count = 0
+    for kind in ('mp3', 'srt'):
+        dir_path = os.path.dirname(artifact_path(channel, '', kind))
+        if not os.path.isdir(dir_path):
+            continue
+        for filename in os.listdir(dir_path):
+            title, file_kind = artifact_title(filename)
+            if file_kind != kind or run.index.get(title, kind):
+                continue
+            record_artifact(run, title, kind)
+            added_count += 1
+
+    if restored_count > 0:
+        logger.info(f"[{channel['name']}] sync_store: 由 store 還原 {restored_count} 個檔案")
+    if added_count > 0:
+        logger.info(f"[{channel['name']}] sync_store: 新增 {added_count} 個檔案到 store")
+
+
+def download_one(run, row, title, tr_pool=None):
+    """
+    下載單一 mp3 到臨時檔案後再改名，有傳入 tr_pool 時成功後視需要排入轉錄工作
+    """
+    channel = run.channel
+    if run.download_failed:
+        return
+
+    mp3_file = os.path.join(channel['mp3_dir'], f"{title}.mp3")
+    tmp_file = os.path.join(channel['mp3_dir'], f"{title}.tmp.mp3")
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    logger.info(f"[{channel['name']}] download_mp3: 下載影片中：{title}")
+    try:
+        success = download_mp3_file(row['id'], tmp_file)
+        if success is False or not os.path.exists(tmp_file):
+            raise Exception("下載失敗或檔案不存在")
+        os.replace(tmp_file, mp3_file)
+        record_artifact(run, title, 'mp3')
+        logger.info(f"[{channel['name']}] download_mp3: 完成下載：{title}")
+    except Exception as e:
+        # 下載失敗多半是被限流，停止此頻道剩下的下載
+        run.download_failed = True
+        logger.error(f"[{channel['name']}] download_mp3: 下載失敗 {row['id']},{title}: {str(e)}")
+        if os.path.exists(tmp_file):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+        return
+
+    if tr_pool is not None and channel['srt_source'] == 'whisper' and run.take_srt_budget():
+        caption_or_transcribe(run, row, title, tr_pool)
+
+
+def try_captions(run, row, title):
+    """
+    caption_first 的頻道先下載 YouTube 的日文字幕（手動或自動產生），
+    品質分數達到 caption_threshold 時直接採用，不必執行 whisper
+
+    Returns:
+        True 表示已採用 YouTube 字幕
+    """
+    channel = run.channel
+    if not channel.get('caption_first'):
+        return False
+
+    mp3_file = os.path.join(channel['mp3_dir'], f"{title}.mp3")
+    srt_file = os.path.join(channel['srt_dir'], f"{title}.srt")
+    tmp_file = os.path.join(channel['srt_dir'], f"{title}.tmp.srt")
+    try:
+        os.makedirs(channel['srt_dir'], exist_ok=True)
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        caption_kind = download_captions(row['id'], tmp_file, 'ja')
+        if caption_kind is None or not os.path.exists(tmp_file):
+            logger.info(f"[{channel['name']}] caption_first: 沒有日文字幕（手動或自動），改用 whisper：{title}")
+            return False
+
+        score, details = caption_score(tmp_file, mp3_duration(mp3_file))
+        summary = ' '.join(f"{k}={v:.2f}" for k, v in details.items())
+        threshold = channel.get('caption_threshold', 0.7)
+        failed = below_minimum(details)
+        if score < threshold or failed:
+            reason = f"未達最低要求 {','.join(failed)}" if failed else f"{score:.2f} < {threshold}"
+            logger.info(f"[{channel['name']}] caption_first: {caption_kind} 字幕品質不足 {reason}（{summary}），改用 whisper：{title}")
+            return False
+
+        os.replace(tmp_file, srt_file)
+        record_artifact(run, title, 'srt')
+        # 記錄字幕來源，plan 重建時改用 whisper
+        run.index.update(title, 'srt', source='youtube')
+        record_transcript(run, row, title, 'youtube')
+        logger.info(f"[{channel['name']}] caption_first: 採用 YouTube {caption_kind} 字幕 {score:.2f}（{summary}）：{title}")
+        return True
+    except Exception as e:
+        logger.error(f"[{channel['name']}] caption_first: 字幕檢查失敗 {title}: {str(e)}")
+        return False
+    finally:
+        if os.path.exists(tmp_file):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+
+
+def caption_or_transcribe(run, row, title, tr_pool):
+    """
+    在下載 pool 中先嘗試 YouTube 字幕，不佔用轉錄 worker；品質不足時才排入 whisper，
+    排入的工作記錄在 run.transcriptions
+    """
+    if not try_captions(run, row, title):
+        future = submit(tr_pool, transcribe_one, run, row, title)
+        with run.lock:
+            run.transcriptions.append(future)
+
+
+def transcribe_one(run, row, title, caption_first=False):
+    """
+    以 whisper 將 mp3 轉為 srt 字幕，caption_first 為 True 時先嘗試 YouTube 字幕
+    """
+    channel = run.channel
+    mp3_file = os.path.join(channel['mp3_dir'], f"{title}.mp3")
+    srt_file = os.path.join(channel['srt_dir'], f"{title}.srt")
+    if os.path.exists(srt_file):
+        return
+    if caption_first and try_captions(run, row, title):
+        return
+    try:
+        transcribe_audio(mp3_file, srt_file)
+        record_artifact(run, title, 'srt')
+        record_transcript(run, row, title)
+        logger.info(f"[{channel['name']}] transcribe_srt: 完成字幕 {title}")
+    except Exception as e:
+        logger.error(f"[{channel['name']}] transcribe_srt: 字幕產生失敗 {title}: {str(e)}")
+
+
+def download_srt_one(run, row, title):
+    """
+    下載 YouTube 影片的日文字幕
+    """
+    channel = run.channel
+    srt_file = os.path.join(channel['srt_dir'], f"{title}.srt")
+    logger.info(f"[{channel['name']}] download_srt: 下載字幕中：{title}")
+    try:
+        success = download_subtitle(row['id'], srt_file, ['ja'])
+        if success and os.path.exists(srt_file):
+            record_artifact(run, title, 'srt')
+            record_transcript(run, row, title)
+            logger.info(f"[{channel['name']}] download_srt: 完成下載：{srt_file}")
+        else:
+            logger.warning(f"[{channel['name']}] download_srt: 影片沒有日文字幕：{title}")
+    except Exception as e:
+        logger.error(f"[{channel['name']}] download_srt: 字幕下載失敗 {title}: {str(e)}")
+
+
+def plan_downloads(run, tr_pool):
+    """
+    找出需要下載的 mp3（最多 max_downloads 個）
+    """
+    channel = run.channel
+    os.makedirs(channel['mp3_dir'], exist_ok=True)
+
+    tasks = []
+    for row in ordered_rows(channel, run.df):
+        if len(tasks) >= channel['max_downloads']:
+            break
+        title = file_title(channel, row)
+        if os.path.exists(os.path.join(channel['mp3_dir'], f"{title}.mp3")):
+            continue
+        # 已被 retention 刪除的檔案不再下載
+        if run.index.is_evicted(title, 'mp3'):
+            continue
+        tasks.append((download_one, run, row, title, tr_pool))
+    return tasks
+
+
+def plan_srt(run, tr_pool):
+    """
+    找出需要產生字幕的項目：whisper 頻道處理已下載但沒有字幕的 mp3，
+    youtube 頻道直接下載字幕
+    """
+    channel = run.channel
+    os.makedirs(channel['srt_dir'], exist_ok=True)
+
+    tasks = []
+    for row in ordered_rows(channel, run.df):
+        title = file_title(channel, row)
+        if os.path.exists(os.path.join(channel['srt_dir'], f"{title}.srt")):
+            continue
+        if run.index.is_evicted(title, 'srt'):
+            continue
+        if channel['srt_source'] == 'whisper':
+            if not os.path.exists(os.path.join(channel['mp3_dir'], f"{title}.mp3")):
+                continue
+            if not run.take_srt_budget():
+                break
+            if channel.get('caption_first'):
+                tasks.append(('download', (caption_or_transcribe, run, row, title, tr_pool)))
+            else:
+                tasks.append(('transcribe', (transcribe_one, run, row, title)))
+        else:
+            if not run.take_srt_budget():
+                break
+            tasks.append(('download', (download_srt_one, run, row, title)))
+    return tasks
+
+
+def copy_files(run):
+    """
+    將 mp3、notes、srt 檔案複製到 google_dir
+    若設定 publish_last，只保留最後 N 筆資料的檔案，刪除更早的檔案
+    """
+    channel = run.channel
+    google_dir = channel['google_dir']
+    os.makedirs(google_dir, exist_ok=True)
+
+    df = run.df
+    if channel['publish_last']:
+        df = df.tail(channel['publish_last'])
+    keep_titles = {file_title(channel, row) for _, row in df.iterrows()}
+
+    copied_count = 0
+    deleted_count = 0
+
+    for title in keep_titles:
+        for kind in ('mp3', 'notes', 'srt'):
+            src_file = artifact_path(channel, title, kind)
+            dst_file = os.path.join(google_dir, os.path.basename(src_file))
+            if not os.path.exists(src_file):
+                continue
+            if os.path.exists(dst_file):
+                run.index.mark_published(title, kind)
+                continue
+            try:
+                # 同一個磁碟區時以 hardlink/reflink 發佈，不複製位元組
+                digest = run.manifest.get(title, kind)
+                if digest is None or not artifact_store.materialize(digest, dst_file):
+                    artifact_store.link_or_copy(src_file, dst_file)
+                run.index.mark_published(title, kind)
+                copied_count += 1
+                logger.info(f"已複製：{os.path.basename(src_file)}")
+            except Exception as e:
+                logger.error(f"複製失敗 {os.path.basename(src_file)}: {str(e)}")
+
+    if channel['publish_last']:
+        for filename in os.listdir(google_dir):
+            title, kind = artifact_title(filename)
+            if kind not in ('mp3', 'notes', 'srt') or title in keep_titles:
+                continue
+            try:
+                os.remove(os.path.join(google_dir, filename))
+                deleted_count += 1
+                logger.info(f"已刪除：{filename}")
+            except Exception as e:
+                logger.error(f"刪除失敗 {filename}: {str(e)}")
+
+    if copied_count > 0:
+        logger.info(f"[{channel['name']}] copy_files: 完成複製 {copied_count} 個檔案")
+    if deleted_count > 0:
+        logger.info(f"[{channel['name']}] copy_files: 完成刪除 {deleted_count} 個檔案")
+
+
+def run_channels(channels, pools, publish=True):
+    """
+    在同一個程序中處理所有頻道，下載、轉錄與複製各自共用一個 pool
+
+    每個階段的工作以輪流交錯的順序送入 pool，避免單一頻道佔滿 worker；
+    下載另外經過各頻道的 ChannelQueue，依頻道設定限制同時下載數與間隔
+    """
+    runs = []
+    for channel in channels:
+        try:
+            df = load_list(channel)
+        except Exception as e:
+            logger.error(f"[{channel['name']}] 讀取清單失敗: {str(e)}")
+            continue
+        write_notes(channel, df)
+        run = ChannelRun(channel, df)
+        sync_store(run)
+        runs.append(run)
+
+    dl_pool = ThreadPoolExecutor(max_workers=pools.get('download', 2))
+    tr_pool = ThreadPoolExecutor(max_workers=pools.get('transcribe', 1))
+
+    for run in runs:
+        run.open_queue(dl_pool)
+
+    # 對 YouTube 的請求經過各頻道的佇列，限制每個頻道的同時下載數與間隔
+    srt_plans = [plan_srt(run, tr_pool) for run in runs]
+    for kind, task in round_robin(srt_plans):
+        if kind == 'transcribe':
+            submit(tr_pool, *task)
+        else:
+            task[1].queue.put(*task)
+    for task in round_robin([plan_downloads(run, tr_pool) for run in runs]):
+        task[1].queue.put(*task)
+
+    # 下載完成後才會排入新的轉錄工作，所以先等所有頻道的佇列與下載 pool 結束
+    for run in runs:
+        run.queue.wait()
+    dl_pool.shutdown(wait=True)
+    tr_pool.shutdown(wait=True)
+    compact()
+
+    if publish:
+        # 先清理再發佈，feed 與 google_dir 才不會列出本次被刪除的檔案
+        for run in runs:
+            try:
+                apply_retention(run.channel, run.df, run.manifest, run.index)
+            except Exception as e:
+                logger.error(f"[{run.channel['name']}] retention 失敗: {str(e)}")
+
+        base_url = load_feed_config()['base_url']
+        with ThreadPoolExecutor(max_workers=pools.get('copy', 4)) as cp_pool:
+            for run in runs:
+                # publish: 'copy' 複製到 google_dir，'feed' 產生 podcast feed 由本地伺服器提供
+                if run.channel.get('publish', 'copy') == 'feed':
+                    submit(cp_pool, update_feed, run.channel, run.df, run.manifest, base_url, run.index)
+                else:
+                    submit(cp_pool, copy_files, run)
+
+    for run in runs:
+        run.manifest.save()
+        run.index.save()
+
+    collect_garbage()
+
+
+def main(names=None, publish=True):
+    pools, channels = load_channels()
+    if names:
+        channels = [c for c in channels if c['name'] in names]
+
+    start = time.time()
+    logger.info(f"開始執行更新程序：{', '.join(c['name'] for c in channels)}")
+    run_channels(channels, pools, publish=publish)
+    logger.info(f"更新程序完成，耗時 {time.time() - start:.1f} 秒")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='依 channels.json 更新所有頻道')
+    parser.add_argument('--channel', action='append', help='只處理指定的頻道（可重複）')
+    parser.add_argument('--no-publish', action='store_true', help='不發佈（不複製到 google_dir，也不產生 feed）')
+    args = parser.parse_args()
+    main(args.channel, publish=not args.no_publish)
@@ -0,0 +1,29 @@
+import re
+
+TIME_RE = re.compile(r'(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)')
+
+
+def parse_srt(srt_file):
+    """
+    解析 srt 檔案
+
+    Returns:
+        [(start, end, text)]，時間單位為秒
+    """
+    with open(srt_file, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+
+    segments = []
+    for block in re.split(r'\n\s*\n', content.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        for i, line in enumerate(lines):
+            m = TIME_RE.search(line)
+            if not m:
+                continue
+            h1, m1, s1, ms1, h2, m2, s2, ms2 = (int(x) for x in m.groups())
+            start = h1 * 3600 + m1 * 60 + s1 + ms1 / 1000
+            end = h2 * 3600 + m2 * 60 + s2 + ms2 / 1000
+            text = ' '.join(l.strip() for l in lines[i + 1:] if l.strip())
+            segments.append((start, end, text))
+            break
+    return segments
@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import uuid
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from lib.mylog import setup_logger
+from channels import root_dir, load_channels, file_title, artifact_path, title_date
+from srt_parser import parse_srt
+
+# 設定 logger
+logger = setup_logger('youtube_update')
+
+# === 設定目錄路徑 ===
+# 以 channel=<頻道>/date=<日期>/ 分割的 parquet 檔案，不進 git
+transcripts_dir = os.path.join(root_dir, 'transcripts/')
+
+SCHEMA = pa.schema([
+    ('title', pa.string()),
+    ('video_id', pa.string()),
+    ('seq', pa.int32()),
+    ('start', pa.float64()),
+    ('end', pa.float64()),
+    ('text', pa.string()),
+    ('avg_logprob', pa.float64()),
+    ('source', pa.string()),
+    ('ingested_at', pa.float64()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('channel', pa.string()), ('date', pa.string())]), flavor='hive')
+
+# 無法判斷上架日期時的分割目錄，不會被日期條件選到
+UNKNOWN_DATE = 'unknown'
+
+def partition_date(channel, row, title):
+    """
+    以上架日期作為分割日期（YYYY-MM-DD）：CSV 的 date，其次為檔名中的日期，都沒有時為 UNKNOWN_DATE
+
+    只由 catalog 決定，重新轉錄時會寫入同一個分割目錄
+    """
+    date = str(row.get('date', 'unknown'))
+    if re.fullmatch(r'\d{8}', date):
+        return f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', date):
+        return date
+    return title_date(channel, title) or UNKNOWN_DATE
+
+
+def write_part(table, part_dir):
+    """
+    寫入新的 parquet 檔案，暫存檔以 '.' 開頭，查詢時不會被讀到
+    """
+    name = f"part-{uuid.uuid4().hex}.parquet"
+    tmp_file = os.path.join(part_dir, f".{name}.tmp")
+    pq.write_table(table, tmp_file)
+    os.replace(tmp_file, os.path.join(part_dir, name))
+
+
+def append_segments(channel, row, title, srt_file, source, avg_logprobs=None, store=transcripts_dir):
+    """
+    將一個 srt 的所有字幕段落寫成一個新的 parquet 檔案
+
+    重新轉錄時不刪除舊資料，查詢與 compact 時以 ingested_at 最新的一次為準
+
+    Args:
+        avg_logprobs: 與段落對應的 avg log-prob（whisper 有提供時），沒有時為 null
+
+    Returns:
+        寫入的段落數
+    """
+    segments = parse_srt(srt_file)
+    if not segments:
+        return 0
+
+    count = len(segments)
+    if avg_logprobs is None or len(avg_logprobs) != count:
+        avg_logprobs = [None] * count
+
+    table = pa.Table.from_pydict({
+        'title': [title] * count,
+        'video_id': [str(row['id'])] * count,
+        'seq': list(range(count)),
+        'start': [s[0] for s in segments],
+        'end': [s[1] for s in segments],
+        'text': [s[2] for s in segments],
+        'avg_logprob': avg_logprobs,
+        'source': [source] * count,
+        'ingested_at': [time.time()] * count,
+    }, schema=SCHEMA)
+
+    part_dir = os.path.join(store, f"channel={channel['name']}", f"date={partition_date(channel, row, title)}")
+    os.makedirs(part_dir, exist_ok=True)
+    write_part(table, part_dir)
+    return count
+
+
+def latest_only(df):
+    """
+    同一個 title 有多次寫入時，只保留 ingested_at 最新的一次（有 channel 欄位時依頻道分開計算）
+    """
+    if df.empty or 'ingested_at' not in df.columns:
+        return df
+    keys = ['channel', 'title'] if 'channel' in df.columns else ['title']
+    latest = df.groupby(keys)['ingested_at'].transform('max')
+    return df[df['ingested_at'] == latest]
+
+
+def compact(store=transcripts_dir):
+    """
+    將每個分割目錄中的小檔案合併為一個檔案，並移除被重新轉錄取代的段落
+
+    以頻道為單位判斷每個 title 最新的一次寫入，舊的寫入在其他分割目錄時也會被移除。
+    只處理含有多個檔案或含有被取代段落的分割目錄
+
+    Returns:
+        合併的分割目錄數
+    """
+    compacted = 0
+    if not os.path.isdir(store):
+        return compacted
+
+    for channel_part in sorted(os.listdir(store)):
+        channel_dir = os.path.join(store, channel_part)
+        if not os.path.isdir(channel_dir):
+            continue
+
+        parts = {}
+        for date_part in sorted(os.listdir(channel_dir)):
+            part_dir = os.path.join(channel_dir, date_part)
+            if os.path.isdir(part_dir):
+                parts[part_dir] = sorted(os.path.join(part_dir, f) for f in os.listdir(part_dir)
+                                         if f.endswith('.parquet'))
+
+        # 先只讀 title 與 ingested_at，找出每個 title 最新的寫入時間
+        keys = {f: pq.read_table(f, columns=['title', 'ingested_at']).to_pandas()
+                for part_files in parts.values() for f in part_files}
+        if not keys:
+            continue
+        latest = pd.concat(keys.values(), ignore_index=True).groupby('title')['ingested_at'].max()
+
+        for part_dir, part_files in parts.items():
+            # 只有多個檔案或含有被取代段落的分割目錄才讀取完整資料
+            superseded = any((keys[f]['ingested_at'] < keys[f]['title'].map(latest)).any() for f in part_files)
+            if len(part_files) < 2 and not superseded:
+                continue
+            df = pd.concat([pq.read_table(f, schema=SCHEMA).to_pandas() for f in part_files], ignore_index=True)
+            keep = df[df['ingested_at'] == df['title'].map(latest)]
+
+            if not keep.empty:
+                keep = keep.sort_values(['title', 'seq'])
+                write_part(pa.Table.from_pandas(keep, schema=SCHEMA, preserve_index=False), part_dir)
+            for f in part_files:
+                os.remove(f)
+            if keep.empty:
+                os.rmdir(part_dir)
+            compacted += 1
+
+    if compacted > 0:
+        logger.info(f"transcript_store: 合併 {compacted} 個分割目錄")
+    return compacted
+
+
+def query(columns=None, channel=None, date_from=None, date_to=None, where=None, store=transcripts_dir):
+    """
+    查詢字幕段落，channel 與日期條件直接套用在分割目錄上，不讀取無關的檔案
+
+    where 在去除重複寫入之後才套用，被重新轉錄取代的段落不會因為符合條件而被傳回
+
+    Args:
+        columns: 要讀取的欄位，None 表示全部
+        channel: 頻道名稱或名稱 list
+        date_from, date_to: 'YYYY-MM-DD'（含），有指定時不包含 UNKNOWN_DATE
+        where: 額外的 pyarrow.dataset 條件，例如 ds.field('avg_logprob') < -1.0
+
+    Returns:
+        pandas DataFrame，含 channel、date 欄位
+    """
+    if not os.path.isdir(store):
+        return pd.DataFrame(columns=list(columns or SCHEMA.names) + ['channel', 'date'])
+
+    dataset = ds.dataset(store, format='parquet', partitioning=PARTITIONING)
+
+    expr = None
+    conditions = []
+    if channel is not None:
+        names = [channel] if isinstance(channel, str) else list(channel)
+        conditions.append(ds.field('channel').isin(names))
+    if date_from is not None or date_to is not None:
+        conditions.append(ds.field('date') != UNKNOWN_DATE)
+    if date_from is not None:
+        conditions.append(ds.field('date') >= date_from)
+    if date_to is not None:
+        conditions.append(ds.field('date') <= date_to)
+    for condition in conditions:
+        expr = condition if expr is None else expr & condition
+
+    read_columns = None
+    if columns is not None and where is None:
+        # 去除重複寫入需要 channel、title 與 ingested_at；有 where 時讀取全部欄位
+        read_columns = list(dict.fromkeys(list(columns) + ['channel', 'title', 'ingested_at']))
+
+    table = dataset.to_table(columns=read_columns, filter=expr)
+    df = latest_only(table.to_pandas())
+    if where is not None:
+        table = pa.Table.from_pandas(df, schema=table.schema, preserve_index=False)
+        df = ds.dataset(table).to_table(filter=where).to_pandas()
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
+
+
+def record_transcript(run, row, title, source=None):
+    """
+    字幕產生後寫入 transcript store，失敗時只記錄錯誤，不影響字幕本身
+
+    Args:
+        source: 'whisper' 或 'youtube'，預設為頻道的 srt_source
+    """
+    channel = run.channel
+    srt_file = artifact_path(channel, title, 'srt')
+    try:
+        append_segments(channel, row, title, srt_file, source or channel['srt_source'])
+    except Exception as e:
+        logger.error(f"[{channel['name']}] transcript_store: 寫入失敗 {title}: {str(e)}")
+
+
+def backfill(channel, df, store=transcripts_dir):
+    """
+    將尚未寫入的既有 srt 檔案寫入 transcript store（只需執行一次）
+
+    Returns:
+        寫入的檔案數
+    """
+    existing = set()
+    if os.path.isdir(os.path.join(store, f"channel={channel['name']}")):
+        existing = set(query(columns=['title'], channel=channel['name'], store=store)['title'])
+
+    added = 0
+    for _, row in df.iterrows():
+        title = file_title(channel, row)
+        srt_file = artifact_path(channel, title, 'srt')
+        if title in existing or not os.path.exists(srt_file):
+            continue
+        if append_segments(channel, row, title, srt_file, channel['srt_source'], store=store):
+            added += 1
+
+    if added > 0:
+        logger.info(f"[{channel['name']}] transcript_store: 寫入 {added} 個既有字幕")
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='維護 parquet 字幕段落資料')
+    parser.add_argument('--backfill', action='store_true', help='寫入尚未收錄的既有 srt')
+    parser.add_argument('--compact', action='store_true', help='合併小檔案')
+    args = parser.parse_args()
+
+    if args.backfill:
+        _, channels = load_channels()
+        for channel in channels:
+            backfill(channel, pd.read_csv(channel['csv_file']))
+    if args.compact:
+        compact()